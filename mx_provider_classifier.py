@@ -16,25 +16,41 @@ Version: v0.1.3
 from __future__ import annotations
 
 import argparse
+import asyncio
 import ipaddress
 import csv
 import datetime as dt
+import functools
 import os
+import random
 import re
+import select
+import socket
+import sqlite3
+import struct
 import sys
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Pattern, Tuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 VERSION = "0.1.3"
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".mx_classifier_cache.db")
 
 try:
+    import dns.asyncresolver
     import dns.resolver
 except ImportError:
     print("Missing dependency: dnspython. Install with: pip install dnspython", file=sys.stderr)
     sys.exit(1)
 
+try:
+    import aiodns  # optional: only needed for --engine aiodns
+except ImportError:
+    aiodns = None
+
 
 # ----------------------------
 # Pattern model + matching
@@ -47,10 +63,24 @@ class ProviderPattern:
     pattern: str
     priority: int = 100
     notes: str = ""
+    # Lowercased, dot-stripped pattern; computed once so matches() does no per-call work.
+    normalized: str = field(default="", init=False, repr=False, compare=False)
+    # Compiled once for match_type "regex" (raises re.error for an invalid expression).
+    compiled: Optional[Pattern[str]] = field(default=None, init=False, repr=False, compare=False)
+    # Normalized pattern reversed, for match_type "suffix" (see SuffixTrie).
+    rev_pattern: str = field(default="", init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # Interned, like the normalized MX hosts, so in-process exact-match lookups hit on identity.
+        object.__setattr__(self, "normalized", sys.intern(self.pattern.rstrip(".").lower()))
+        if self.match_type == "regex":
+            object.__setattr__(self, "compiled", re.compile(self.pattern, re.IGNORECASE))
+        if self.match_type == "suffix":
+            object.__setattr__(self, "rev_pattern", self.normalized[::-1])
 
     def matches(self, mx_host: str) -> bool:
         h = mx_host.rstrip(".").lower()
-        p = self.pattern.rstrip(".").lower()
+        p = self.normalized
 
         if self.match_type == "suffix":
             return h.endswith(p)
@@ -59,12 +89,135 @@ class ProviderPattern:
         if self.match_type == "exact":
             return h == p
         if self.match_type == "regex":
-            return re.search(self.pattern, h, flags=re.IGNORECASE) is not None
+            return self.compiled.search(h) is not None
 
         return False
 
 
-def load_patterns(patterns_csv_path: str) -> List[ProviderPattern]:
+class SuffixTrie:
+    """
+    Trie over reversed suffix patterns. Walking a reversed host visits every suffix
+    pattern the host ends with in O(len(host)), however many patterns there are.
+    Each terminal node keeps the best (lowest) rank of the patterns ending there.
+    Both patterns and hosts are passed in already reversed.
+    """
+
+    _RANK = ""  # key for a node's rank; never collides with a single character
+
+    def __init__(self) -> None:
+        self._root: Dict[str, dict] = {}
+
+    def add(self, rev_pattern: str, rank: int) -> None:
+        node = self._root
+        for ch in rev_pattern:
+            node = node.setdefault(ch, {})
+        node[self._RANK] = min(rank, node.get(self._RANK, rank))
+
+    def best_rank(self, rev_host: str) -> Optional[int]:
+        return self._walk(self._root, rev_host, self._root.get(self._RANK))[1]
+
+    def best_rank_all(self, rev_hosts: List[str]) -> Optional[int]:
+        """
+        Best rank over several hosts. Their longest shared suffix (e.g. "aspmx.l.google.com"
+        for aspmx.l.google.com + alt1.aspmx.l.google.com) is walked once, and each host
+        only continues from the node where that shared walk ended.
+        """
+        if len(rev_hosts) == 1:
+            return self.best_rank(rev_hosts[0])
+
+        common = os.path.commonprefix(rev_hosts)
+        node, best = self._walk(self._root, common, self._root.get(self._RANK))
+        if node is None:
+            return best  # the shared suffix already left the trie; no host can go deeper
+
+        skip = len(common)
+        for rh in rev_hosts:
+            best = self._walk(node, rh[skip:], best)[1]
+        return best
+
+    def _walk(self, node: Optional[dict], chars: str, best: Optional[int]) -> Tuple[Optional[dict], Optional[int]]:
+        for ch in chars:
+            node = node.get(ch)
+            if node is None:
+                break
+            rank = node.get(self._RANK)
+            if rank is not None and (best is None or rank < best):
+                best = rank
+        return node, best
+
+
+class PatternTable:
+    """
+    Provider patterns sorted by priority, plus a per-run memo of MX host set -> provider.
+    Domains on the same platform share MX hosts, so most classifications hit the memo.
+
+    A pattern's rank is its position in the sorted list; the lowest-ranked match wins.
+    Patterns are partitioned by match_type at load time. Suffixes go in a SuffixTrie
+    and exact patterns in a dict, so both cost O(len(host)) however many patterns
+    there are. Contains and regex patterns are then tried in rank order, each only
+    while it could still beat the best rank found so far.
+    """
+
+    def __init__(self, patterns: List[ProviderPattern]) -> None:
+        self.patterns = sorted(patterns, key=lambda x: x.priority)
+        self._providers = [pat.provider for pat in self.patterns]
+        self._suffixes = SuffixTrie()
+        self._exact: Dict[str, int] = {}
+        self._contains: List[Tuple[int, str]] = []
+        self._regex_ranks: List[int] = []
+        self._regex_searches: List[Callable[[str], Optional[re.Match]]] = []
+        for rank, pat in enumerate(self.patterns):
+            if pat.match_type == "suffix":
+                self._suffixes.add(pat.rev_pattern, rank)
+            elif pat.match_type == "contains":
+                self._contains.append((rank, pat.normalized))
+            elif pat.match_type == "exact":
+                self._exact.setdefault(pat.normalized, rank)
+            elif pat.match_type == "regex":
+                self._regex_ranks.append(rank)
+                self._regex_searches.append(pat.compiled.search)
+            # Unknown match types never match, so they are left out entirely.
+
+        self._classify_cached = functools.lru_cache(maxsize=None)(self._classify)
+
+    def classify(self, mx_hosts: Tuple[str, ...]) -> Optional[str]:
+        return self._classify_cached(mx_hosts)
+
+    def _classify(self, mx_hosts: Tuple[str, ...]) -> Optional[str]:
+        # Interned after normalizing so exact-match lookups still hit on identity.
+        hosts = tuple(sys.intern(h.rstrip(".").lower()) for h in mx_hosts)
+
+        rev_hosts = [h[::-1] for h in hosts]
+        best = self._suffixes.best_rank_all(rev_hosts)
+
+        if self._exact:
+            for h in hosts:
+                rank = self._exact.get(h)
+                if rank is not None and (best is None or rank < best):
+                    best = rank
+
+        best = self._best_contains(hosts, best)
+
+        for rank, search in zip(self._regex_ranks, self._regex_searches):
+            if best is not None and rank >= best:
+                break
+            if any(search(h) is not None for h in hosts):
+                best = rank
+                break
+
+        return None if best is None else self._providers[best]
+
+    def _best_contains(self, hosts: Tuple[str, ...], best: Optional[int]) -> Optional[int]:
+        for rank, p in self._contains:
+            if best is not None and rank >= best:
+                break
+            for h in hosts:
+                if p in h:
+                    return rank
+        return best
+
+
+def load_patterns(patterns_csv_path: str) -> PatternTable:
     patterns: List[ProviderPattern] = []
     with open(patterns_csv_path, "r", encoding="utf-8", newline="") as f:
         reader = csv.DictReader(f)
@@ -87,52 +240,68 @@ def load_patterns(patterns_csv_path: str) -> List[ProviderPattern]:
             except ValueError:
                 priority = 100
 
-            patterns.append(ProviderPattern(
-                provider=provider,
-                match_type=match_type,
-                pattern=pattern,
-                priority=priority,
-                notes=notes,
-            ))
+            try:
+                patterns.append(ProviderPattern(
+                    provider=provider,
+                    match_type=match_type,
+                    pattern=pattern,
+                    priority=priority,
+                    notes=notes,
+                ))
+            except re.error as e:
+                raise ValueError(f"invalid regex for provider {provider!r}: {pattern!r} ({e})") from e
 
-    patterns.sort(key=lambda x: x.priority)
-    return patterns
+    return PatternTable(patterns)
 
 
-def classify_mx_hosts(mx_hosts: List[str], patterns: List[ProviderPattern]) -> Optional[str]:
+def classify_mx_hosts(mx_hosts: List[str], patterns: PatternTable) -> Optional[str]:
     """
     Decide provider for a domain based on its MX hosts (already filtered to highest-priority set).
     Strategy:
       - Walk patterns by priority (pattern-table priority).
       - If any MX host matches a pattern, return that provider.
+    Results are memoized per MX host set (lookup results are already sorted).
     """
     if not mx_hosts:
         return None
-
-    for pat in patterns:
-        for h in mx_hosts:
-            if pat.matches(h):
-                return pat.provider
-    return None
+    return patterns.classify(tuple(mx_hosts))
+
+_DNS_ERR_MAP: Dict[str, str] = {
+    "NoAnswer": "Bad Domain - No MX",
+    "NXDOMAIN": "Bad Domain - NXDOMAIN",
+    "Timeout": "Bad Domain - Timeout",
+    "NoNameservers": "Bad Domain - NoNameservers",
+    "NoMail": "Bad Domain - No mail",
+    "LocalhostMX": "Bad Domain - Localhost MX",
+    "InvalidMXTarget": "Bad Domain - Invalid MX Target",
+}
 
 def provider_from_dns_error(err: Optional[str]) -> Optional[str]:
-    if not err:
-        return None
-    if err == "NoAnswer":
-        return "Bad Domain - No MX"
-    if err == "NXDOMAIN":
-        return "Bad Domain - NXDOMAIN"
-    if err == "Timeout":
-        return "Bad Domain - Timeout"
-    if err == "NoNameservers":
-        return "Bad Domain - NoNameservers"
-    if err == "NoMail":
-        return "Bad Domain - No mail"
-    if err == "LocalhostMX":
-        return "Bad Domain - Localhost MX"
-    if err == "InvalidMXTarget":
-        return "Bad Domain - Invalid MX Target"
-    return "Bad Domain - DNS Error"
+    return _DNS_ERR_MAP.get(err, "Bad Domain - DNS Error") if err else None
+
+def resolve_provider(mx_hosts: List[str], err: Optional[str], patterns: PatternTable) -> str:
+    """Final bucket for a looked-up domain: pattern match, Bad Domain, Custom MX or Unclassified."""
+    return bucket_provider(classify_mx_hosts(mx_hosts, patterns), mx_hosts, err)
+
+def bucket_provider(provider: Optional[str], mx_hosts: List[str], err: Optional[str]) -> str:
+    """resolve_provider() given the pattern match for `mx_hosts` (None if nothing matched)."""
+    # Special MX conditions that should not become Custom MX
+    if not provider and err in {"NoMail", "LocalhostMX", "InvalidMXTarget"}:
+        provider = provider_from_dns_error(err)
+
+    # Map DNS failures with no MX to explicit "Bad Domain" buckets
+    if not provider and err and not mx_hosts:
+        provider = provider_from_dns_error(err)
+
+    # If MX exists but no provider matched, label as Custom MX
+    if not provider and mx_hosts:
+        provider = "Custom MX"
+
+    # Final fallback: keep everything counted
+    if not provider:
+        provider = "Unclassified"
+
+    return provider
 
 def is_subdomain(child: str, parent: str) -> bool:
     child = child.rstrip(".").lower()
@@ -151,6 +320,10 @@ DOMAIN_RE = re.compile(
 
 EMAIL_RE = re.compile(r"^\s*[^@\s]+@([^@\s]+)\s*$")
 
+SEPARATOR_RE = re.compile(r"[\s,;]+")
+
+LOCALHOST_NAMES = frozenset({"localhost", "localhost.localdomain"})
+
 
 def extract_domain(value: str) -> Optional[str]:
     v = (value or "").strip().strip(",").strip(";").strip()
@@ -158,23 +331,25 @@ def extract_domain(value: str) -> Optional[str]:
         return None
 
     m = EMAIL_RE.match(v)
-    if m:
-        d = m.group(1).strip().lower().rstrip(".")
-        if d in {"localhost", "localhost.localdomain"}:
-            return d
-        if d.startswith("[") and d.endswith("]"):
-            d = d[1:-1]
-        return d if DOMAIN_RE.match(d) or is_ip_literal(d) else None
-
-    d = v.lower().rstrip(".")
-    if d in {"localhost", "localhost.localdomain"}:
+    d = (m.group(1) if m else v).lower().rstrip(".")
+    if d in LOCALHOST_NAMES:
         return d
     if d.startswith("[") and d.endswith("]"):
         d = d[1:-1]
     return d if DOMAIN_RE.match(d) or is_ip_literal(d) else None
 
 
+# Characters an IPv4/IPv6 literal can contain (before any "%zone" suffix).
+IP_LITERAL_CHARS = frozenset("0123456789abcdefABCDEF.:")
+
+
 def is_ip_literal(value: str) -> bool:
+    # Cheap character check first: raising and catching ValueError from ipaddress is
+    # by far the slowest part of rejecting the names, headers and free text found in
+    # typical input files.
+    addr = value.split("%", 1)[0]
+    if not addr or not IP_LITERAL_CHARS.issuperset(addr):
+        return False
     try:
         ipaddress.ip_address(value)
         return True
@@ -199,6 +374,8 @@ def is_internal_only_domain(domain: str) -> bool:
 
 def read_domains_from_file(path: str, dedupe: bool = True) -> List[str]:
     domains: List[str] = []
+    add = domains.append
+    extract = extract_domain
     with open(path, "r", encoding="utf-8", errors="replace") as f:
         sample = f.read(4096)
         f.seek(0)
@@ -208,13 +385,10 @@ def read_domains_from_file(path: str, dedupe: bool = True) -> List[str]:
             try:
                 reader = csv.reader(f)
                 for row in reader:
-                    if not row:
-                        continue
-                    candidates = row[:3] if len(row) >= 3 else row
-                    for cell in candidates:
-                        d = extract_domain(cell)
+                    for cell in row[:3]:
+                        d = extract(cell)
                         if d:
-                            domains.append(d)
+                            add(d)
                             break
                 return sorted(set(domains)) if dedupe else domains
             except csv.Error:
@@ -225,15 +399,15 @@ def read_domains_from_file(path: str, dedupe: bool = True) -> List[str]:
             if not line:
                 continue
 
-            d = extract_domain(line)
+            d = extract(line)
             if d:
-                domains.append(d)
+                add(d)
                 continue
 
-            for part in re.split(r"[\s,;]+", line):
-                d2 = extract_domain(part)
+            for part in SEPARATOR_RE.split(line):
+                d2 = extract(part)
                 if d2:
-                    domains.append(d2)
+                    add(d2)
 
     return sorted(set(domains)) if dedupe else domains
 
@@ -242,73 +416,763 @@ def read_domains_from_file(path: str, dedupe: bool = True) -> List[str]:
 # MX lookup (highest priority only)
 # ----------------------------
 
+LookupResult = Tuple[str, Optional[int], List[str], Optional[str]]
+
+DEFAULT_ENGINE = "async"
+DEFAULT_WORKERS = {"async": 500, "aiodns": 500, "udp": 500, "tcp": 500, "thread": 20}
+
+
+# Advertised EDNS0 UDP payload. Without EDNS, any MX answer over 512 bytes comes back
+# truncated and costs a TCP retry.
+EDNS_PAYLOAD_SIZE = 4096
+RESOLVER_CACHE_SIZE = 100_000
+
+
+def parse_nameservers(nameserver: Optional[str]) -> List[str]:
+    """--nameserver accepts one address or a comma-separated list."""
+    return [ns.strip() for ns in (nameserver or "").split(",") if ns.strip()]
+
+
+def configure_resolver(r: dns.resolver.BaseResolver, nameserver: Optional[str], timeout: float) -> None:
+    # `timeout` stays the overall per-query budget, but each attempt gets half of it so
+    # a lost UDP datagram is retransmitted once instead of ending as a Timeout.
+    r.lifetime = timeout
+    r.timeout = timeout / 2
+    nameservers = parse_nameservers(nameserver)
+    if nameservers:
+        r.nameservers = nameservers
+    # Spread queries across all configured nameservers instead of always hitting the first.
+    r.rotate = True
+    r.use_edns(0, 0, EDNS_PAYLOAD_SIZE)
+    # Answers repeated within a run (shared CNAME targets, fallback retries) skip the wire.
+    r.cache = dns.resolver.LRUCache(RESOLVER_CACHE_SIZE)
+
+
 def build_resolver(nameserver: Optional[str], timeout: float) -> dns.resolver.Resolver:
     r = dns.resolver.Resolver(configure=True)
-    r.lifetime = timeout
-    r.timeout = timeout
-    if nameserver:
-        r.nameservers = [nameserver]
+    configure_resolver(r, nameserver, timeout)
     return r
 
 
+def build_async_resolver(nameserver: Optional[str], timeout: float) -> dns.asyncresolver.Resolver:
+    r = dns.asyncresolver.Resolver(configure=True)
+    configure_resolver(r, nameserver, timeout)
+    return r
+
+
+def highest_priority_result(domain: str, records: List[Tuple[int, str]]) -> LookupResult:
+    """
+    Build a lookup result from raw (preference, exchange) MX records.
+
+    "Highest priority MX" means the lowest preference value.
+    If multiple MX records share that preference, we keep them all.
+    """
+    normalized: List[Tuple[int, str]] = []
+    for pref, exchange in records:
+        raw_host = exchange.strip().lower()
+        # Null MX (RFC 7505) can appear as a single dot.
+        # Keep it as "." so we can detect "no mail" explicitly.
+        host = "." if raw_host == "." else raw_host.rstrip(".")
+        normalized.append((pref, sys.intern(host)))
+
+    if not normalized:
+        return domain, None, [], "NoAnswer"
+
+    best_pref = min(pref for pref, _ in normalized)
+    best_hosts = sorted({host for pref, host in normalized if pref == best_pref})
+
+    # Localhost MX: explicitly broken / internal-only MX target
+    if best_hosts == ["localhost"] or best_hosts == ["localhost.localdomain"]:
+        return domain, best_pref, best_hosts, "LocalhostMX"
+
+    # Invalid placeholder / malformed MX targets
+    if best_hosts == ["~"]:
+        return domain, best_pref, best_hosts, "InvalidMXTarget"
+
+    # If the highest-priority MX is a Null MX ("."), the domain does not accept mail.
+    if best_hosts == ["."]:
+        return domain, best_pref, best_hosts, "NoMail"
+
+    return domain, best_pref, best_hosts, None
+
+
+def lookup_error(e: Exception) -> str:
+    if isinstance(e, dns.resolver.NXDOMAIN):
+        return "NXDOMAIN"
+    if isinstance(e, dns.resolver.NoAnswer):
+        return "NoAnswer"
+    if isinstance(e, dns.resolver.NoNameservers):
+        return "NoNameservers"
+    if isinstance(e, dns.exception.Timeout):
+        return "Timeout"
+    return f"Error: {type(e).__name__}"
+
+
 def lookup_mx_highest_priority(
     domain: str,
     resolver: dns.resolver.Resolver
-) -> Tuple[str, Optional[int], List[str], Optional[str]]:
+) -> LookupResult:
     """
     Returns (domain, best_pref, mx_hosts_at_best_pref_sorted, error_message)
-
-    "Highest priority MX" means the lowest preference value.
-    If multiple MX records share that preference, we keep them all.
     """
     try:
         answers = resolver.resolve(domain, "MX")
-        records: List[Tuple[int, str]] = []
-        for rdata in answers:
-            pref = int(getattr(rdata, "preference"))
-            raw_host = str(getattr(rdata, "exchange")).strip().lower()
-            # Null MX (RFC 7505) can appear as a single dot.
-            # Keep it as "." so we can detect "no mail" explicitly.
-            host = "." if raw_host == "." else raw_host.rstrip(".")
-            records.append((pref, host))
+        return highest_priority_result(domain, [
+            (int(getattr(rdata, "preference")), str(getattr(rdata, "exchange")))
+            for rdata in answers
+        ])
+    except Exception as e:
+        return domain, None, [], lookup_error(e)
 
-        if not records:
-            return domain, None, [], "NoAnswer"
 
-        best_pref = min(pref for pref, _ in records)
-        best_hosts = sorted({host for pref, host in records if pref == best_pref})
+async def lookup_mx_highest_priority_async(
+    domain: str,
+    resolver: dns.asyncresolver.Resolver
+) -> LookupResult:
+    """Async variant of lookup_mx_highest_priority()."""
+    try:
+        answers = await resolver.resolve(domain, "MX")
+        return highest_priority_result(domain, [
+            (int(getattr(rdata, "preference")), str(getattr(rdata, "exchange")))
+            for rdata in answers
+        ])
+    except Exception as e:
+        return domain, None, [], lookup_error(e)
 
-        # Localhost MX: explicitly broken / internal-only MX target
-        if best_hosts == ["localhost"] or best_hosts == ["localhost.localdomain"]:
-            return domain, best_pref, best_hosts, "LocalhostMX"
 
-        # Invalid placeholder / malformed MX targets
-        if best_hosts == ["~"]:
-            return domain, best_pref, best_hosts, "InvalidMXTarget"
+def lookup_all_threaded(domains: List[str], resolver: dns.resolver.Resolver, workers: int) -> List[LookupResult]:
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        return list(ex.map(functools.partial(lookup_mx_highest_priority, resolver=resolver), domains))
 
-        # If the highest-priority MX is a Null MX ("."), the domain does not accept mail.
-        if best_hosts == ["."]:
-            return domain, best_pref, best_hosts, "NoMail"
 
-        return domain, best_pref, best_hosts, None
+async def lookup_all_bounded(
+    domains: List[str],
+    workers: int,
+    lookup: Callable[[str], Awaitable[LookupResult]],
+) -> List[LookupResult]:
+    """
+    Run `lookup` for every domain with at most `workers` queries in flight.
+    A fixed set of worker coroutines drains a shared iterator, so memory stays flat
+    no matter how long the domain list is.
+    """
+    results: List[LookupResult] = []
+    remaining = iter(domains)
 
+    async def worker() -> None:
+        for d in remaining:
+            results.append(await lookup(d))
 
-    except dns.resolver.NXDOMAIN:
-        return domain, None, [], "NXDOMAIN"
-    except dns.resolver.NoAnswer:
-        return domain, None, [], "NoAnswer"
-    except dns.resolver.NoNameservers:
-        return domain, None, [], "NoNameservers"
-    except dns.exception.Timeout:
-        return domain, None, [], "Timeout"
+    await asyncio.gather(*(worker() for _ in range(max(1, min(workers, len(domains))))))
+    return results
+
+
+async def lookup_all_async(
+    domains: List[str],
+    nameserver: Optional[str],
+    timeout: float,
+    workers: int,
+) -> List[LookupResult]:
+    resolver = build_async_resolver(nameserver, timeout)
+    return await lookup_all_bounded(domains, workers, lambda d: lookup_mx_highest_priority_async(d, resolver))
+
+
+# c-ares status codes mapped onto the error names used by the dnspython engines.
+ARES_ERRORS: Dict[int, str] = {} if aiodns is None else {
+    aiodns.error.ARES_ENOTFOUND: "NXDOMAIN",
+    aiodns.error.ARES_ENODATA: "NoAnswer",
+    aiodns.error.ARES_ETIMEOUT: "Timeout",
+    aiodns.error.ARES_ESERVFAIL: "NoNameservers",
+    aiodns.error.ARES_EREFUSED: "NoNameservers",
+    aiodns.error.ARES_ECONNREFUSED: "NoNameservers",
+}
+
+
+async def lookup_mx_highest_priority_aiodns(domain: str, resolver: "aiodns.DNSResolver") -> LookupResult:
+    """c-ares variant of lookup_mx_highest_priority(); records are parsed in C."""
+    try:
+        if hasattr(resolver, "query_dns"):  # aiodns >= 4
+            answer = await resolver.query_dns(domain, "MX")
+            records = [(rr.data.priority, rr.data.exchange) for rr in answer.answer if rr.type == 15]
+        else:
+            answer = await resolver.query(domain, "MX")
+            records = [(rr.priority, rr.host) for rr in answer]
+        # c-ares reports a Null MX target as an empty name rather than "."
+        return highest_priority_result(domain, [(pref, host or ".") for pref, host in records])
+    except aiodns.error.DNSError as e:
+        code = e.args[0] if e.args else None
+        return domain, None, [], ARES_ERRORS.get(code, f"Error: {type(e).__name__}")
     except Exception as e:
         return domain, None, [], f"Error: {type(e).__name__}"
 
 
+async def lookup_all_aiodns(
+    domains: List[str],
+    nameserver: Optional[str],
+    timeout: float,
+    workers: int,
+) -> List[LookupResult]:
+    # Two tries of timeout/2 keep `timeout` an overall per-query budget (like the
+    # dnspython lifetime) while still retransmitting once if a UDP packet is lost.
+    resolver = aiodns.DNSResolver(nameservers=parse_nameservers(nameserver) or None, timeout=timeout / 2, tries=2)
+    return await lookup_all_bounded(domains, workers, lambda d: lookup_mx_highest_priority_aiodns(d, resolver))
+
+
+# ----------------------------
+# Bulk MX resolvers (one UDP socket / one pipelined TCP connection)
+# ----------------------------
+
+DNS_TYPE_MX = 15
+DNS_TYPE_OPT = 41
+DNS_CLASS_IN = 1
+
+DNS_FLAG_QR = 0x8000
+DNS_FLAG_TC = 0x0200
+DNS_FLAG_RD = 0x0100
+
+RCODE_NOERROR = 0
+RCODE_FORMERR = 1
+RCODE_NXDOMAIN = 3
+RCODE_NOTIMP = 4
+
+
+class DNSFormatError(ValueError):
+    """A DNS response that cannot be parsed."""
+
+
+def encode_mx_query(txid: int, domain: str) -> bytes:
+    """Wire-format MX query with RD set and an EDNS0 OPT record advertising a 4096 B payload."""
+    qname = b"".join(bytes([len(label)]) + label for label in domain.encode("idna").split(b".") if label)
+    header = struct.pack("!HHHHHH", txid, DNS_FLAG_RD, 1, 0, 0, 1)
+    question = qname + b"\x00" + struct.pack("!HH", DNS_TYPE_MX, DNS_CLASS_IN)
+    opt = b"\x00" + struct.pack("!HHIH", DNS_TYPE_OPT, EDNS_PAYLOAD_SIZE, 0, 0)
+    return header + question + opt
+
+
+def read_dns_name(msg: bytes, offset: int) -> Tuple[str, int]:
+    """Returns (name, offset just past the name), following compression pointers."""
+    labels: List[str] = []
+    end: Optional[int] = None
+    jumps = 0
+    while True:
+        if offset >= len(msg):
+            raise DNSFormatError("name runs past end of message")
+        length = msg[offset]
+        if length & 0xC0 == 0xC0:
+            if offset + 1 >= len(msg):
+                raise DNSFormatError("truncated compression pointer")
+            if end is None:
+                end = offset + 2
+            jumps += 1
+            if jumps > 64:
+                raise DNSFormatError("compression pointer loop")
+            offset = ((length & 0x3F) << 8) | msg[offset + 1]
+            continue
+        if length > 63:
+            raise DNSFormatError("invalid label length")
+        offset += 1
+        if length == 0:
+            break
+        labels.append(msg[offset:offset + length].decode("ascii", errors="replace").lower())
+        offset += length
+    name = ".".join(labels) if labels else "."
+    return name, end if end is not None else offset
+
+
+def parse_mx_response(msg: bytes) -> Tuple[int, int, bool, str, List[Tuple[int, str]]]:
+    """
+    Returns (txid, rcode, truncated, question_name, [(preference, exchange), ...]).
+    Only MX RDATA is decoded; other answer records (e.g. a CNAME chain) are skipped.
+    """
+    try:
+        txid, flags, qdcount, ancount, _, _ = struct.unpack_from("!HHHHHH", msg)
+        if not flags & DNS_FLAG_QR:
+            raise DNSFormatError("not a response")
+
+        offset = 12
+        qname = ""
+        for _ in range(qdcount):
+            qname, offset = read_dns_name(msg, offset)
+            offset += 4
+
+        records: List[Tuple[int, str]] = []
+        for _ in range(ancount):
+            _, offset = read_dns_name(msg, offset)
+            rtype, _, _, rdlength = struct.unpack_from("!HHIH", msg, offset)
+            offset += 10
+            if rtype == DNS_TYPE_MX:
+                (pref,) = struct.unpack_from("!H", msg, offset)
+                exchange, _ = read_dns_name(msg, offset + 2)
+                records.append((pref, exchange))
+            offset += rdlength
+    except struct.error as e:
+        raise DNSFormatError(str(e)) from e
+
+    return txid, flags & 0x000F, bool(flags & DNS_FLAG_TC), qname, records
+
+
+def mx_result_from_response(domain: str, rcode: int, records: List[Tuple[int, str]]) -> LookupResult:
+    if rcode == RCODE_NOERROR:
+        return highest_priority_result(domain, records)
+    if rcode == RCODE_NXDOMAIN:
+        return domain, None, [], "NXDOMAIN"
+    # SERVFAIL / REFUSED etc.: the same bucket dnspython reports when every server fails.
+    return domain, None, [], "NoNameservers"
+
+
+def response_matches(domain: str, rcode: int, qname: str) -> bool:
+    """
+    Whether a response (already matched by transaction ID) answers the query for `domain`.
+    Servers that reject EDNS0 often send FORMERR / NOTIMP without echoing the question,
+    so a question-less error answer is accepted on the transaction ID alone.
+    """
+    if not qname:
+        return rcode in (RCODE_FORMERR, RCODE_NOTIMP)
+    return qname == domain.lower()
+
+
+def shuffled_txids() -> deque:
+    """All 65536 DNS transaction IDs in random order; callers recycle them as answers arrive."""
+    ids = list(range(65536))
+    random.shuffle(ids)
+    return deque(ids)
+
+
+class BulkMXResolver:
+    """
+    MassDNS-style MX resolver: every query goes out over one UDP socket and answers are
+    matched back by transaction ID, skipping dnspython's per-query Resolver / Message work.
+
+    At most `max_inflight` queries are outstanding at once; unanswered queries are resent
+    every RETRY_INTERVAL seconds until `timeout` expires. Truncated (TC=1) answers, and
+    servers that reject EDNS0, fall back to the regular resolver, which retries over TCP.
+    """
+
+    RETRY_INTERVAL = 2.0
+    SCAN_INTERVAL = 0.05
+
+    def __init__(
+        self,
+        nameserver: str,
+        timeout: float,
+        max_inflight: int,
+        fallback: dns.resolver.Resolver,
+        port: int = 53,
+    ) -> None:
+        self.address = (nameserver, port)
+        self.family = socket.AF_INET6 if ":" in nameserver else socket.AF_INET
+        self.timeout = timeout
+        self.max_inflight = max(1, min(max_inflight, 65536))
+        self.fallback = fallback
+
+    def resolve_all(self, domains: List[str]) -> List[LookupResult]:
+        results: List[LookupResult] = []
+        needs_fallback: List[str] = []
+
+        queue = deque(domains)
+        free_ids = shuffled_txids()
+        # txid -> [domain, packet, deadline, resend_at]
+        pending: Dict[int, list] = {}
+
+        with socket.socket(self.family, socket.SOCK_DGRAM) as sock:
+            sock.setblocking(False)
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+            except OSError:
+                pass
+
+            next_scan = 0.0
+            while queue or pending:
+                now = time.monotonic()
+
+                while queue and len(pending) < self.max_inflight:
+                    domain = queue.popleft()
+                    txid = free_ids.popleft()
+                    try:
+                        packet = encode_mx_query(txid, domain)
+                    except ValueError as e:
+                        free_ids.append(txid)
+                        results.append((domain, None, [], f"Error: {type(e).__name__}"))
+                        continue
+                    pending[txid] = [domain, packet, now + self.timeout, now + self.RETRY_INTERVAL]
+                    if not self._send(sock, pending[txid], now):
+                        del pending[txid]
+                        free_ids.append(txid)
+                        results.append((domain, None, [], "NoNameservers"))
+
+                readable, _, _ = select.select([sock], [], [], self.SCAN_INTERVAL)
+                if readable:
+                    self._drain(sock, pending, free_ids, results, needs_fallback)
+
+                now = time.monotonic()
+                if now >= next_scan:
+                    next_scan = now + self.SCAN_INTERVAL
+                    for txid, entry in list(pending.items()):
+                        if now >= entry[2]:
+                            del pending[txid]
+                            free_ids.append(txid)
+                            results.append((entry[0], None, [], "Timeout"))
+                        elif now >= entry[3]:
+                            entry[3] = now + self.RETRY_INTERVAL
+                            if not self._send(sock, entry, now):
+                                del pending[txid]
+                                free_ids.append(txid)
+                                results.append((entry[0], None, [], "NoNameservers"))
+
+        if needs_fallback:
+            results.extend(lookup_all_threaded(needs_fallback, self.fallback, DEFAULT_WORKERS["thread"]))
+        return results
+
+    def _send(self, sock: socket.socket, entry: list, now: float) -> bool:
+        """False if the server cannot be reached at all (e.g. ENETUNREACH, EACCES)."""
+        try:
+            sock.sendto(entry[1], self.address)
+        except (BlockingIOError, InterruptedError):
+            # Send buffer full: try again on the next scan instead of waiting a full retry.
+            entry[3] = now + self.SCAN_INTERVAL
+        except OSError:
+            return False
+        return True
+
+    def _drain(
+        self,
+        sock: socket.socket,
+        pending: Dict[int, list],
+        free_ids: deque,
+        results: List[LookupResult],
+        needs_fallback: List[str],
+    ) -> None:
+        while True:
+            try:
+                data, addr = sock.recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # e.g. ICMP port unreachable surfaced as ECONNREFUSED; queries will time out.
+                return
+            if addr[0] != self.address[0]:
+                continue
+            try:
+                txid, rcode, truncated, qname, records = parse_mx_response(data)
+            except DNSFormatError:
+                continue
+
+            entry = pending.get(txid)
+            if entry is None or not response_matches(entry[0], rcode, qname):
+                continue  # late duplicate, or an answer for a recycled transaction ID
+            del pending[txid]
+            free_ids.append(txid)
+
+            if truncated or rcode in (RCODE_FORMERR, RCODE_NOTIMP):
+                needs_fallback.append(entry[0])
+            else:
+                results.append(mx_result_from_response(entry[0], rcode, records))
+
+
+class PipelinedTCPResolver:
+    """
+    Sends MX queries back-to-back over a single TCP connection (RFC 7766 pipelining) and
+    reads the length-prefixed answers as they arrive, matching them by transaction ID.
+    Meant for bulk scans against one recursor: there is no per-query socket setup and
+    many queries share each write(2) / read(2).
+
+    If the server closes the connection, outstanding queries are resent on a new one.
+    After MAX_RECONNECTS consecutive connections that answered nothing (or failed to
+    connect), the remaining domains go through the regular resolver instead.
+    """
+
+    MAX_RECONNECTS = 3
+    SCAN_INTERVAL = 0.05
+
+    def __init__(
+        self,
+        nameserver: str,
+        timeout: float,
+        max_inflight: int,
+        fallback: dns.resolver.Resolver,
+        port: int = 53,
+    ) -> None:
+        self.address = (nameserver, port)
+        self.family = socket.AF_INET6 if ":" in nameserver else socket.AF_INET
+        self.timeout = timeout
+        self.max_inflight = max(1, min(max_inflight, 65536))
+        self.fallback = fallback
+
+    def resolve_all(self, domains: List[str]) -> List[LookupResult]:
+        results: List[LookupResult] = []
+        needs_fallback: List[str] = []
+        queue = deque(domains)
+        free_ids = shuffled_txids()
+        # txid -> [domain, deadline]
+        pending: Dict[int, list] = {}
+
+        failures = 0
+        while queue or pending:
+            if failures > self.MAX_RECONNECTS:
+                needs_fallback.extend(entry[0] for entry in pending.values())
+                needs_fallback.extend(queue)
+                break
+            try:
+                sock = socket.create_connection(self.address, timeout=self.timeout)
+            except OSError:
+                failures += 1
+                continue
+
+            answered = len(results)
+            with sock:
+                sock.setblocking(False)
+                self._run(sock, queue, pending, free_ids, results, needs_fallback)
+            failures = 0 if len(results) > answered else failures + 1
+
+            # Connection dropped: requeue whatever was still outstanding.
+            for txid, entry in pending.items():
+                free_ids.append(txid)
+                queue.appendleft(entry[0])
+            pending.clear()
+
+        if needs_fallback:
+            results.extend(lookup_all_threaded(needs_fallback, self.fallback, DEFAULT_WORKERS["thread"]))
+        return results
+
+    def _run(
+        self,
+        sock: socket.socket,
+        queue: deque,
+        pending: Dict[int, list],
+        free_ids: deque,
+        results: List[LookupResult],
+        needs_fallback: List[str],
+    ) -> None:
+        """Pipeline queries over `sock` until the work is done or the connection drops."""
+        outbuf = bytearray()
+        inbuf = bytearray()
+        next_scan = 0.0
+
+        while queue or pending or outbuf:
+            now = time.monotonic()
+            while queue and len(pending) < self.max_inflight:
+                domain = queue.popleft()
+                txid = free_ids.popleft()
+                try:
+                    packet = encode_mx_query(txid, domain)
+                except ValueError as e:
+                    free_ids.append(txid)
+                    results.append((domain, None, [], f"Error: {type(e).__name__}"))
+                    continue
+                pending[txid] = [domain, now + self.timeout]
+                outbuf += struct.pack("!H", len(packet)) + packet
+
+            readable, writable, _ = select.select([sock], [sock] if outbuf else [], [], self.SCAN_INTERVAL)
+            try:
+                if writable:
+                    sent = sock.send(outbuf)
+                    del outbuf[:sent]
+                if readable:
+                    data = sock.recv(65536)
+                    if not data:
+                        return
+                    inbuf += data
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError:
+                return
+
+            while len(inbuf) >= 2:
+                (length,) = struct.unpack_from("!H", inbuf)
+                if len(inbuf) < 2 + length:
+                    break
+                msg = bytes(inbuf[2:2 + length])
+                del inbuf[:2 + length]
+                try:
+                    txid, rcode, _, qname, records = parse_mx_response(msg)
+                except DNSFormatError:
+                    continue
+                entry = pending.get(txid)
+                if entry is None or not response_matches(entry[0], rcode, qname):
+                    continue
+                del pending[txid]
+                free_ids.append(txid)
+                if rcode in (RCODE_FORMERR, RCODE_NOTIMP):
+                    needs_fallback.append(entry[0])
+                else:
+                    results.append(mx_result_from_response(entry[0], rcode, records))
+
+            now = time.monotonic()
+            if now >= next_scan:
+                next_scan = now + self.SCAN_INTERVAL
+                for txid, entry in list(pending.items()):
+                    if now >= entry[1]:
+                        del pending[txid]
+                        free_ids.append(txid)
+                        results.append((entry[0], None, [], "Timeout"))
+
+
+# ----------------------------
+# MX lookup cache (persists across runs)
+# ----------------------------
+
+DEFAULT_CACHE_TTL = 3600
+NEGATIVE_CACHE_TTL = 300
+
+# NXDOMAIN / NoAnswer are real answers about the domain, so they are cached (briefly).
+# Timeouts, server failures and unexpected errors are transient and never cached.
+NEGATIVE_CACHE_ERRORS = {"NXDOMAIN", "NoAnswer"}
+CACHEABLE_ERRORS = NEGATIVE_CACHE_ERRORS | {"NoMail", "LocalhostMX", "InvalidMXTarget"}
+
+
+class MXCache:
+    """
+    SQLite-backed store of lookup_mx_highest_priority() results, keyed by domain.
+    Positive answers stay fresh for `ttl` seconds, NXDOMAIN / NoAnswer for `negative_ttl`.
+    """
+
+    # Stay well under SQLite's bound-parameter limit (999 on older builds).
+    QUERY_CHUNK = 500
+
+    def __init__(self, path: str, ttl: int = DEFAULT_CACHE_TTL, negative_ttl: int = NEGATIVE_CACHE_TTL) -> None:
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS mx_cache ("
+            "domain TEXT PRIMARY KEY, "
+            "best_pref INTEGER, "
+            "mx_hosts TEXT NOT NULL, "
+            "error TEXT, "
+            "fetched_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_many(self, domains: List[str]) -> Dict[str, LookupResult]:
+        """Fresh cached results for `domains`, fetched QUERY_CHUNK keys per SELECT."""
+        now = time.time()
+        oldest = now - max(self.ttl, self.negative_ttl)
+        hits: Dict[str, LookupResult] = {}
+        # Most domains share a handful of MX host sets; split and intern each set only once.
+        host_lists: Dict[str, List[str]] = {}
+        for i in range(0, len(domains), self.QUERY_CHUNK):
+            chunk = domains[i:i + self.QUERY_CHUNK]
+            rows = self._conn.execute(
+                "SELECT domain, best_pref, mx_hosts, error, fetched_at FROM mx_cache "
+                f"WHERE fetched_at > ? AND domain IN ({','.join('?' * len(chunk))})",
+                (oldest, *chunk),
+            )
+            for domain, best_pref, mx_hosts, err, fetched_at in rows:
+                ttl = self.negative_ttl if err in NEGATIVE_CACHE_ERRORS else self.ttl
+                if fetched_at > now - ttl:
+                    hosts = host_lists.get(mx_hosts)
+                    if hosts is None:
+                        hosts = [sys.intern(h) for h in mx_hosts.split(";")] if mx_hosts else []
+                        host_lists[mx_hosts] = hosts
+                    hits[domain] = (domain, best_pref, hosts, err)
+        return hits
+
+    def put_many(self, results: List[LookupResult]) -> None:
+        """Store results in one transaction; transient failures are skipped."""
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO mx_cache (domain, best_pref, mx_hosts, error, fetched_at) VALUES (?, ?, ?, ?, ?)",
+            (
+                (domain, best_pref, ";".join(mx_hosts), err, now)
+                for domain, best_pref, mx_hosts, err in results
+                if not err or err in CACHEABLE_ERRORS
+            ),
+        )
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.commit()
+        self._conn.close()
+
+    def discard(self) -> None:
+        """Close without committing; any unfinished write is rolled back."""
+        self._conn.close()
+
+
+def cache_unavailable(path: str, e: sqlite3.Error) -> None:
+    print(f"MX cache unavailable ({path}: {e}); continuing without it.", file=sys.stderr)
+
+
+def open_cache(path: str, ttl: int, negative_ttl: int) -> Optional[MXCache]:
+    try:
+        return MXCache(path, ttl=ttl, negative_ttl=negative_ttl)
+    except sqlite3.Error as e:
+        cache_unavailable(path, e)
+        return None
+
+
+def drop_cache(cache: MXCache, path: str, e: sqlite3.Error) -> None:
+    """The cache is only an optimization: report the error and let the run carry on without it."""
+    cache_unavailable(path, e)
+    try:
+        cache.discard()
+    except sqlite3.Error:
+        pass
+
+
+# ----------------------------
+# Classification (process pool for large runs)
+# ----------------------------
+
+# Below this many distinct MX host sets, process start-up and pickling cost more than they
+# save. Domains sharing a host set are classified once, so the domain count does not matter.
+PARALLEL_CLASSIFY_MIN_HOST_SETS = 50_000
+
+_worker_patterns: Optional[PatternTable] = None
+
+
+def _init_classify_worker(patterns_csv_path: str) -> None:
+    global _worker_patterns
+    _worker_patterns = load_patterns(patterns_csv_path)
+
+
+def classify_chunk(chunk: List[Tuple[str, ...]]) -> Dict[Tuple[str, ...], Optional[str]]:
+    """Process-pool task: match one slice of distinct MX host sets with the worker's own PatternTable."""
+    return {hosts: _worker_patterns.classify(hosts) for hosts in chunk}
+
+
+def classify_results(
+    results: List[LookupResult],
+    patterns: PatternTable,
+    patterns_csv_path: str,
+    processes: int,
+) -> Dict[str, str]:
+    """
+    Map each looked-up domain to its provider. Runs with many distinct MX host sets have
+    those sets split into one chunk per process and matched on a ProcessPoolExecutor;
+    each worker loads the patterns file once. Only the distinct sets are sent to workers.
+    """
+    host_sets = list({tuple(mx_hosts) for _, _, mx_hosts, _ in results if mx_hosts})
+    if processes <= 1 or len(host_sets) < PARALLEL_CLASSIFY_MIN_HOST_SETS:
+        return {domain: resolve_provider(mx_hosts, err, patterns) for domain, _, mx_hosts, err in results}
+
+    size = -(-len(host_sets) // processes)
+    chunks = [host_sets[i:i + size] for i in range(0, len(host_sets), size)]
+    matched: Dict[Tuple[str, ...], Optional[str]] = {}
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=_init_classify_worker,
+        initargs=(patterns_csv_path,),
+    ) as ex:
+        for part in ex.map(classify_chunk, chunks):
+            matched.update(part)
+
+    return {
+        domain: bucket_provider(matched.get(tuple(mx_hosts)), mx_hosts, err)
+        for domain, _, mx_hosts, err in results
+    }
+
+
 # ----------------------------
 # Output helpers
 # ----------------------------
 
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+
+def open_output_csv(path: str):
+    return open(path, "w", encoding="utf-8", newline="", buffering=OUTPUT_BUFFER_SIZE)
+
+
 def dated_output_name(input_path: str, result_type: str) -> str:
     base = os.path.basename(input_path)
     name, _ = os.path.splitext(base)
@@ -334,7 +1198,7 @@ def write_counts(
     # Sort by record_count desc, then domain_count desc, then provider name
     rows.sort(key=lambda x: (-x[2], -x[1], x[0].lower()))
 
-    with open(path, "w", encoding="utf-8", newline="") as f:
+    with open_output_csv(path) as f:
         w = csv.writer(f)
         w.writerow(["provider", "domain_count", "record_count"])
         w.writerows(rows)
@@ -345,25 +1209,35 @@ def write_domains(
     domain_to_best_pref: Dict[str, Optional[int]],
     domain_to_mx: Dict[str, List[str]],
 ) -> None:
-    with open(path, "w", encoding="utf-8", newline="") as f:
+    rows = []
+    for domain in sorted(domain_to_provider):
+        best_pref = domain_to_best_pref.get(domain)
+        rows.append((
+            domain,
+            domain_to_provider[domain],
+            "" if best_pref is None else best_pref,
+            ";".join(domain_to_mx.get(domain, [])),
+        ))
+
+    with open_output_csv(path) as f:
         w = csv.writer(f)
         w.writerow(["domain", "provider", "best_mx_preference", "mx_hosts"])
-        for domain in sorted(domain_to_provider.keys()):
-            provider = domain_to_provider[domain]
-            best_pref = domain_to_best_pref.get(domain)
-            mx_hosts = ";".join(domain_to_mx.get(domain, []))
-            w.writerow([domain, provider, "" if best_pref is None else best_pref, mx_hosts])
+        w.writerows(rows)
 
 
 def write_unclassified(
     path: str,
     unclassified: List[Tuple[str, Optional[int], List[str], Optional[str]]]
 ) -> None:
-    with open(path, "w", encoding="utf-8", newline="") as f:
+    rows = [
+        (domain, "" if best_pref is None else best_pref, ";".join(mx_hosts), err or "")
+        for domain, best_pref, mx_hosts, err in sorted(unclassified, key=lambda x: x[0])
+    ]
+
+    with open_output_csv(path) as f:
         w = csv.writer(f)
         w.writerow(["domain", "best_mx_preference", "mx_hosts", "error"])
-        for domain, best_pref, mx_hosts, err in sorted(unclassified, key=lambda x: x[0]):
-            w.writerow([domain, "" if best_pref is None else best_pref, ";".join(mx_hosts), err or ""])
+        w.writerows(rows)
 
 
 # ----------------------------
@@ -374,11 +1248,21 @@ def main() -> int:
     ap = argparse.ArgumentParser(description=f"MX Provider Classifier {VERSION}: classify domains by MX provider patterns (highest priority MX only).")
     ap.add_argument("--input", default=None, help="Path to input file. If omitted, you'll be prompted.")
     ap.add_argument("--patterns", default=os.path.join(SCRIPT_DIR, "provider_patterns.csv"), help="CSV file with MX classification patterns.")
-    ap.add_argument("--nameserver", default=None, help="Optional DNS server IP to query (ex: 8.8.8.8).")
+    ap.add_argument("--nameserver", default=None, help="Optional DNS server IP(s) to query, comma-separated (ex: 8.8.8.8,1.1.1.1).")
     ap.add_argument("--timeout", type=float, default=4.0, help="DNS timeout in seconds.")
-    ap.add_argument("--workers", type=int, default=20, help="Concurrent lookup workers.")
+    ap.add_argument("--engine", choices=sorted(DEFAULT_WORKERS), default=DEFAULT_ENGINE, help="DNS lookup engine: asyncio (dnspython), aiodns (c-ares), udp (single-socket bulk sender), tcp (pipelined single connection) or thread pool.")
+    ap.add_argument("--workers", type=int, default=None, help="Concurrent lookups (default: 500 for async, 20 for thread).")
+    ap.add_argument("--processes", type=int, default=os.cpu_count() or 1, help=f"Processes used to classify runs with {PARALLEL_CLASSIFY_MIN_HOST_SETS:,}+ distinct MX host sets (1 disables).")
+    ap.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="SQLite file used to cache MX lookups between runs.")
+    ap.add_argument("--no-cache", action="store_true", help="Always query DNS; do not read or write the MX cache.")
+    ap.add_argument("--cache-ttl", type=int, default=DEFAULT_CACHE_TTL, help="Seconds a cached MX answer stays fresh.")
+    ap.add_argument("--cache-negative-ttl", type=int, default=NEGATIVE_CACHE_TTL, help="Seconds a cached NXDOMAIN / NoAnswer stays fresh.")
     args = ap.parse_args()
 
+    if args.engine == "aiodns" and aiodns is None:
+        print("Missing dependency: aiodns. Install with: pip install aiodns", file=sys.stderr)
+        return 2
+
     input_path = args.input
     if not input_path:
         input_path = input("Enter the path to your source file (emails/domains): ").strip()
@@ -392,7 +1276,11 @@ def main() -> int:
         print("Create it using the sample provider_patterns.csv shown earlier.", file=sys.stderr)
         return 2
 
-    patterns = load_patterns(args.patterns)
+    try:
+        patterns = load_patterns(args.patterns)
+    except ValueError as e:
+        print(f"Invalid patterns file {args.patterns}: {e}", file=sys.stderr)
+        return 2
     raw_domains = read_domains_from_file(input_path, dedupe=False)
     domains = sorted(set(raw_domains))
 
@@ -400,8 +1288,6 @@ def main() -> int:
         print("No valid domains or emails found in input file.", file=sys.stderr)
         return 2
 
-    resolver = build_resolver(args.nameserver, args.timeout)
-
     domain_to_mx: Dict[str, List[str]] = {}
     domain_to_best_pref: Dict[str, Optional[int]] = {}
     domain_to_provider: Dict[str, str] = {}
@@ -428,43 +1314,60 @@ def main() -> int:
             domain_to_mx[domain] = []
             domain_to_provider[domain] = "Invalid Input - Internal Domain"
 
-    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as ex:
-        futures = [ex.submit(lookup_mx_highest_priority, d, resolver) for d in dns_domains]
-        for fut in as_completed(futures):
-            domain, best_pref, mx_hosts, err = fut.result()
-            domain_to_best_pref[domain] = best_pref
-            domain_to_mx[domain] = mx_hosts
-
-            provider = classify_mx_hosts(mx_hosts, patterns)
-
-            # Special MX conditions that should not become Custom MX
-            if not provider and err in {"NoMail", "LocalhostMX", "InvalidMXTarget"}:
-                provider = provider_from_dns_error(err)
+    cache = None if args.no_cache else open_cache(args.cache, args.cache_ttl, args.cache_negative_ttl)
 
-            # Map DNS failures with no MX to explicit "Bad Domain" buckets
-            if not provider and err and not mx_hosts:
-                provider = provider_from_dns_error(err)
+    cached: Dict[str, LookupResult] = {}
+    if cache:
+        try:
+            cached = cache.get_many(dns_domains)
+        except sqlite3.Error as e:
+            drop_cache(cache, args.cache, e)
+            cache = None
+    results: List[LookupResult] = list(cached.values())
+    to_lookup = [d for d in dns_domains if d not in cached]
 
-            # If MX exists but no provider matched, label as Custom MX
-            if not provider and mx_hosts:
-                provider = "Custom MX"
-
-            # Final fallback: keep everything counted
-            if not provider:
-                provider = "Unclassified"
-
-            domain_to_provider[domain] = provider
+    workers = args.workers or DEFAULT_WORKERS[args.engine]
+    try:
+        if args.engine == "thread":
+            resolver = build_resolver(args.nameserver, args.timeout)
+            lookups = lookup_all_threaded(to_lookup, resolver, workers)
+        elif args.engine in ("udp", "tcp"):
+            resolver = build_resolver(args.nameserver, args.timeout)
+            bulk_cls = BulkMXResolver if args.engine == "udp" else PipelinedTCPResolver
+            bulk = bulk_cls(resolver.nameservers[0], args.timeout, workers, fallback=resolver)
+            lookups = bulk.resolve_all(to_lookup)
+        elif args.engine == "aiodns":
+            lookups = asyncio.run(lookup_all_aiodns(to_lookup, args.nameserver, args.timeout, workers))
+        else:
+            lookups = asyncio.run(lookup_all_async(to_lookup, args.nameserver, args.timeout, workers))
+
+        results.extend(lookups)
+        if cache:
+            try:
+                cache.put_many(lookups)
+                cache.close()
+            except sqlite3.Error as e:
+                drop_cache(cache, args.cache, e)
+            cache = None
+    finally:
+        if cache:
+            # Lookups were interrupted; nothing new to store.
+            cache.discard()
+
+    for domain, best_pref, mx_hosts, _ in results:
+        domain_to_best_pref[domain] = best_pref
+        domain_to_mx[domain] = mx_hosts
+
+    domain_to_provider.update(classify_results(results, patterns, args.patterns, args.processes))
 
     # domain_count: how many unique domains mapped to each provider
-    provider_domain_counts: Dict[str, int] = {}
-    for provider in domain_to_provider.values():
-        provider_domain_counts[provider] = provider_domain_counts.get(provider, 0) + 1
-
-    # record_count: how many input records (including duplicates) mapped to each provider
-    provider_record_counts: Dict[str, int] = {}
-    for d in raw_domains:
-        p = domain_to_provider.get(d, "Unclassified")
-        provider_record_counts[p] = provider_record_counts.get(p, 0) + 1
+    provider_domain_counts: Dict[str, int] = Counter(domain_to_provider.values())
+
+    # record_count: how many input records (including duplicates) mapped to each provider.
+    # Count records per domain first (in C), then fold the much shorter domain list.
+    provider_record_counts: Dict[str, int] = Counter()
+    for d, n in Counter(raw_domains).items():
+        provider_record_counts[domain_to_provider.get(d, "Unclassified")] += n
 
     out_counts = dated_output_name(input_path, "counts")
     out_domains = dated_output_name(input_path, "domains")